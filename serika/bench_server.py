@@ -0,0 +1,123 @@
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from typing import (Dict, List)
+
+from bril_type import JsonType
+
+# Compare the latency of running a pipeline through the optimization server
+# against spawning one process per pass, the way the command line tools are
+# chained together:
+#
+#   python3 bench_server.py prog.json -n 100 -p to_ssa coalesce destruct_ssa
+
+HERE: str = os.path.dirname(os.path.abspath(__file__))
+
+# The passes that have a JSON-in/JSON-out command line tool
+CLI_SCRIPTS: Dict[str, str] = {
+    'to_ssa': 'to_ssa.py',
+    'destruct_ssa': 'destruct_ssa.py',
+    'coalesce': 'coalesce.py',
+    'inline': 'inline.py',
+    'simplify_cfg': 'simplify_cfg.py',
+}
+
+
+def run_cli(program: str, pipeline: List[str]) -> str:
+    for name in pipeline:
+        program = subprocess.run(
+            [sys.executable, os.path.join(HERE, CLI_SCRIPTS[name])],
+            input=program,
+            capture_output=True,
+            text=True,
+            check=True
+        ).stdout
+    return program
+
+
+def bench_cli(program: str, pipeline: List[str], n: int) -> List[float]:
+    latencies: List[float] = []
+    for _ in range(n):
+        start = time.perf_counter()
+        run_cli(program, pipeline)
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def bench_server(program: JsonType, pipeline: List[str],
+                 n: int) -> List[float]:
+    server = subprocess.Popen(
+        [sys.executable, os.path.join(HERE, 'server.py')],
+        stdin=subprocess.PIPE,
+        stdout=subprocess.PIPE,
+        text=True
+    )
+
+    latencies: List[float] = []
+    try:
+        # The first request also waits for the server to start, don't time it
+        for i in range(n + 1):
+            request: str = json.dumps({
+                'id': i,
+                'program': program,
+                'pipeline': pipeline
+            })
+            start = time.perf_counter()
+            server.stdin.write(request + '\n')
+            server.stdin.flush()
+            response: JsonType = json.loads(server.stdout.readline())
+            if 'error' in response:
+                raise RuntimeError(response['error'])
+            if i > 0:
+                latencies.append(time.perf_counter() - start)
+    finally:
+        server.stdin.close()
+        server.wait()
+    return latencies
+
+
+def report(name: str, latencies: List[float]):
+    ordered: List[float] = sorted(latencies)
+    p99: float = ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))]
+    print(
+        f"{name:>8}: mean {statistics.mean(ordered) * 1e3:8.2f} ms, "
+        f"p50 {statistics.median(ordered) * 1e3:8.2f} ms, "
+        f"p99 {p99 * 1e3:8.2f} ms"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Benchmark the optimization server against the CLI.'
+    )
+    parser.add_argument('program', help='a Bril program, in JSON')
+    parser.add_argument(
+        '-n', type=int, default=50, help='number of requests to time'
+    )
+    parser.add_argument(
+        '-p',
+        '--pipeline',
+        nargs='+',
+        default=['to_ssa', 'destruct_ssa'],
+        choices=sorted(CLI_SCRIPTS.keys())
+    )
+    args = parser.parse_args()
+
+    with open(args.program) as f:
+        text: str = f.read()
+
+    cli: List[float] = bench_cli(text, args.pipeline, args.n)
+    server: List[float] = bench_server(json.loads(text), args.pipeline, args.n)
+
+    print(f"pipeline: {' '.join(args.pipeline)}, {args.n} requests")
+    report('cli', cli)
+    report('server', server)
+    print(f"speedup: {statistics.mean(cli) / statistics.mean(server):.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,186 @@
+import json
+import sys
+from typing import (Callable, Dict, List, Optional, Sequence, Tuple)
+
+from bril_type import JsonType
+from to_ssa import UNDEFINED_VAR
+
+# A reference interpreter for core Bril, so passes can be checked in-process
+# without `brili`. It follows `brili`: 64-bit wrapping integer arithmetic,
+# phis read the label executed just before the current one, and falling off
+# the end of a function returns.
+
+# Give up on programs that run for longer than this many instructions.
+DEFAULT_MAX_STEPS: int = 1_000_000
+
+
+class BrilError(Exception):
+    """Raised when a program goes wrong at run time."""
+    pass
+
+
+def _wrap(value: int) -> int:
+    value &= (1 << 64) - 1
+    return value - (1 << 64) if value >= 1 << 63 else value
+
+
+def _div(a: int, b: int) -> int:
+    if b == 0:
+        raise BrilError('division by zero')
+    q = abs(a) // abs(b)
+    return _wrap(q if (a < 0) == (b < 0) else -q)
+
+
+VALUE_OPS: Dict[str, Callable] = {
+    'add': lambda a, b: _wrap(a + b),
+    'sub': lambda a, b: _wrap(a - b),
+    'mul': lambda a, b: _wrap(a * b),
+    'div': _div,
+    'eq': lambda a, b: a == b,
+    'lt': lambda a, b: a < b,
+    'gt': lambda a, b: a > b,
+    'le': lambda a, b: a <= b,
+    'ge': lambda a, b: a >= b,
+    'not': lambda a: not a,
+    'and': lambda a, b: a and b,
+    'or': lambda a, b: a or b,
+    'id': lambda a: a,
+}
+
+
+def format_value(value) -> str:
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    return str(value)
+
+
+class _State:
+    def __init__(self, program: JsonType, max_steps: int):
+        self.functions: Dict[str, JsonType] = {
+            func['name']: func
+            for func in program['functions']
+        }
+        self.out: List[str] = []
+        self.steps: int = 0
+        self.max_steps: int = max_steps
+
+
+def _get(env: Dict[str, object], var: str):
+    if var not in env:
+        raise BrilError(f'undefined variable {var}')
+    return env[var]
+
+
+def _call(state: _State, name: str, args: List[object]):
+    if name not in state.functions:
+        raise BrilError(f'undefined function {name}')
+    func: JsonType = state.functions[name]
+    params: List[JsonType] = func.get('args', [])
+    if len(params) != len(args):
+        raise BrilError(f'function {name} expects {len(params)} arguments')
+    env: Dict[str, object] = {
+        param['name']: arg
+        for param, arg in zip(params, args)
+    }
+
+    instrs: List[JsonType] = func['instrs']
+    labels: Dict[str, int] = {
+        instr['label']: i
+        for i, instr in enumerate(instrs) if 'label' in instr
+    }
+    last_label: Optional[str] = None
+    cur_label: Optional[str] = None
+
+    pc: int = 0
+    while pc < len(instrs):
+        instr: JsonType = instrs[pc]
+        pc += 1
+        if 'label' in instr:
+            last_label, cur_label = cur_label, instr['label']
+            continue
+
+        state.steps += 1
+        if state.steps > state.max_steps:
+            raise BrilError('step limit exceeded')
+
+        op: str = instr['op']
+        if op == 'const':
+            env[instr['dest']] = instr['value']
+        elif op in VALUE_OPS:
+            env[instr['dest']] = VALUE_OPS[op](
+                *[_get(env, arg) for arg in instr['args']]
+            )
+        elif op == 'phi':
+            var: Optional[str] = None
+            if last_label in instr['labels']:
+                var = instr['args'][instr['labels'].index(last_label)]
+            if var is None or var == UNDEFINED_VAR:
+                env.pop(instr['dest'], None)
+            else:
+                env[instr['dest']] = _get(env, var)
+        elif op == 'print':
+            state.out.append(
+                ' '.join(
+                    format_value(_get(env, arg)) for arg in instr['args']
+                )
+            )
+        elif op == 'nop':
+            pass
+        elif op in ('jmp', 'br'):
+            target: str = instr['labels'][0]
+            if op == 'br' and not _get(env, instr['args'][0]):
+                target = instr['labels'][1]
+            if target not in labels:
+                raise BrilError(f'undefined label {target}')
+            pc = labels[target]
+        elif op == 'ret':
+            return _get(env, instr['args'][0]) if instr.get('args') else None
+        elif op == 'call':
+            value = _call(
+                state, instr['funcs'][0],
+                [_get(env, arg) for arg in instr.get('args', [])]
+            )
+            if 'dest' in instr:
+                if value is None:
+                    raise BrilError(
+                        f"function {instr['funcs'][0]} returned no value"
+                    )
+                env[instr['dest']] = value
+        else:
+            raise BrilError(f'unknown op {op}')
+    return None
+
+
+def run_program(
+    program: JsonType,
+    args: Sequence[object] = (),
+    max_steps: int = DEFAULT_MAX_STEPS
+) -> Tuple[List[str], int]:
+    """Run the `main` function of `program` with `args`. Returns the lines it
+    printed along with the number of instructions executed."""
+    state = _State(program, max_steps)
+    _call(state, 'main', list(args))
+    return state.out, state.steps
+
+
+def parse_arg(text: str):
+    if text in ('true', 'false'):
+        return text == 'true'
+    return int(text)
+
+
+def main():
+    profile: bool = '-p' in sys.argv[1:]
+    args: List[object] = [
+        parse_arg(arg) for arg in sys.argv[1:] if arg != '-p'
+    ]
+
+    out, steps = run_program(json.load(sys.stdin), args)
+    for line in out:
+        print(line)
+    if profile:
+        print(f'total_dyn_inst: {steps}', file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
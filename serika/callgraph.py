@@ -0,0 +1,112 @@
+import json
+import sys
+from typing import (Callable, Dict, List, Set)
+
+from bril_type import JsonType
+
+
+def callees(func: JsonType) -> List[str]:
+    """Get the functions called by `func`, in order of first call."""
+    called: List[str] = []
+    for instr in func['instrs']:
+        if instr.get('op') == 'call':
+            for name in instr.get('funcs', []):
+                if name not in called:
+                    called.append(name)
+    return called
+
+
+def call_graph(program: JsonType) -> Dict[str, List[str]]:
+    """Map every function of `program` to the functions it calls. Calls to
+    functions not defined in the program are dropped."""
+    defined: Set[str] = set(func['name'] for func in program['functions'])
+    return {
+        func['name']: [name for name in callees(func) if name in defined]
+        for func in program['functions']
+    }
+
+
+# Find the strongly connected components with Tarjan's Algorithm
+def strongly_connected_components(
+    graph: Dict[str, List[str]]
+) -> List[List[str]]:
+    """Get the SCCs of `graph`. A component is only emitted once every
+    component it reaches has been, so callees come before their callers."""
+    dfn_num = 0
+    dfn: Dict[str, int] = {}
+    low: Dict[str, int] = {}
+    stack: List[str] = []
+    on_stack: Set[str] = set()
+    sccs: List[List[str]] = []
+
+    def _tarjan(v: str):
+        nonlocal dfn_num
+        dfn_num += 1
+        dfn[v] = low[v] = dfn_num
+        stack.append(v)
+        on_stack.add(v)
+
+        for w in graph[v]:
+            if w not in dfn:
+                _tarjan(w)
+                low[v] = min(low[v], low[w])
+            elif w in on_stack:
+                low[v] = min(low[v], dfn[w])
+
+        if low[v] == dfn[v]:
+            scc: List[str] = []
+            while True:
+                w = stack.pop()
+                on_stack.discard(w)
+                scc.append(w)
+                if w == v:
+                    break
+            sccs.append(scc)
+
+    for v in graph:
+        if v not in dfn:
+            _tarjan(v)
+
+    return sccs
+
+
+def recursive_functions(graph: Dict[str, List[str]]) -> Set[str]:
+    """Get the functions that may (directly or mutually) call themselves."""
+    recursive: Set[str] = set()
+    for scc in strongly_connected_components(graph):
+        if len(scc) > 1 or scc[0] in graph[scc[0]]:
+            recursive.update(scc)
+    return recursive
+
+
+def bottom_up_order(program: JsonType) -> List[str]:
+    """Order the functions of `program` so that callees precede callers
+    (functions in the same SCC are ordered arbitrarily)."""
+    order: List[str] = []
+    for scc in strongly_connected_components(call_graph(program)):
+        order += scc
+    return order
+
+
+def schedule_bottom_up(program: JsonType, func_pass: Callable[[JsonType],
+                                                               None]):
+    """Run `func_pass` over every function of `program`, visiting callees
+    before their callers."""
+    functions: Dict[str, JsonType] = {
+        func['name']: func
+        for func in program['functions']
+    }
+    for name in bottom_up_order(program):
+        func_pass(functions[name])
+
+
+def main():
+    program: JsonType = json.load(sys.stdin)
+    graph = call_graph(program)
+    for name, called in graph.items():
+        print(f"{name}: {' '.join(called)}")
+    print(f"sccs = {strongly_connected_components(graph)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -93,12 +93,49 @@ def edges(blocks):
     return preds, succs
 
 
-def reassemble(blocks):
-    """Flatten a CFG into an instruction list."""
-    # This could optimize slightly by opportunistically eliminating
-    # `jmp .next` and `ret` terminators where it is allowed.
+def reachable(blocks):
+    """Get the set of names of the blocks (with terminators) that can be
+    reached from the entry block.
+    """
+    _, succs = edges(blocks)
+    seen = set()
+    work_list = [next(iter(blocks))]
+    while work_list:
+        name = work_list.pop()
+        if name not in seen:
+            seen.add(name)
+            work_list += succs[name]
+    return seen
+
+
+def reassemble(blocks, fallthrough=False):
+    """Flatten a CFG into an instruction list.
+    With `fallthrough`, opportunistically eliminate `jmp .next` and
+    trailing `ret` terminators, as well as labels nothing refers to.
+    """
+    if not fallthrough:
+        instrs = []
+        for name, block in blocks.items():
+            instrs.append({'label': name})
+            instrs += block
+        return instrs
+
+    referenced = set()
+    for instr in flatten(blocks.values()):
+        referenced.update(instr.get('labels', []))
+
+    names = list(blocks.keys())
     instrs = []
-    for name, block in blocks.items():
-        instrs.append({'label': name})
+    for i, name in enumerate(names):
+        block = list(blocks[name])
+        if block and block[-1]['op'] == 'jmp':
+            if i + 1 < len(names) and block[-1]['labels'] == [names[i + 1]]:
+                block.pop()
+        elif block and block[-1]['op'] == 'ret':
+            if i == len(names) - 1 and not block[-1].get('args'):
+                block.pop()
+
+        if name in referenced:
+            instrs.append({'label': name})
         instrs += block
     return instrs
@@ -0,0 +1,357 @@
+import json
+import sys
+from typing import (Dict, Iterable, List, Set, Tuple)
+
+from bril_type import (BlockType, JsonType)
+from cfg import (block_map, add_entry, add_terminators, edges, reassemble)
+from dataflow import (solve_use, solve_def, union)
+from form_blocks import form_blocks
+from to_ssa import UNDEFINED_VAR
+
+# Copy coalescing over an interference graph, meant to be run on the output of
+# `to_ssa` (either before or after `destruct_ssa`). Variables related by a
+# phi (or an `id` copy) that don't interfere are merged into a single name, so
+# the copies inserted for them by `destruct_ssa` become self-copies and vanish.
+
+COALESCE_MODES: Tuple[str, ...] = (
+    'aggressive', 'briggs', 'george', 'conservative'
+)
+
+# The number of "registers" assumed by the conservative (Briggs/George) tests.
+DEFAULT_K: int = 16
+
+
+def _phis(block: BlockType) -> List[JsonType]:
+    return [instr for instr in block if instr.get('op') == 'phi']
+
+
+def _non_phis(block: BlockType) -> List[JsonType]:
+    return [instr for instr in block if instr.get('op') != 'phi']
+
+
+def phi_uses(named_blocks: Dict[str, BlockType]) -> Dict[str, Set[str]]:
+    """Map each block to the variables its successors' phis read along the
+    edge leaving it."""
+    uses: Dict[str, Set[str]] = {name: set() for name in named_blocks}
+    for block in named_blocks.values():
+        for phi in _phis(block):
+            for label, arg in zip(phi['labels'], phi['args']):
+                if label in uses and arg != UNDEFINED_VAR:
+                    uses[label].add(arg)
+    return uses
+
+
+def ssa_liveness(
+    named_blocks: Dict[str, BlockType]
+) -> Tuple[Dict[str, Set[str]], Dict[str, Set[str]]]:
+    """Live variable analysis that understands phis: a phi argument is live
+    out of the predecessor it flows from (and nowhere else), a phi destination
+    is defined at the very top of its block."""
+    _, succs = edges(named_blocks)
+    edge_uses = phi_uses(named_blocks)
+
+    block_use: Dict[str, Set[str]] = {}
+    block_def: Dict[str, Set[str]] = {}
+    for name, block in named_blocks.items():
+        block_use[name] = solve_use(_non_phis(block)) - set(
+            phi['dest'] for phi in _phis(block)
+        )
+        block_def[name] = solve_def(block)
+
+    live_in: Dict[str, Set[str]] = {name: set() for name in named_blocks}
+    live_out: Dict[str, Set[str]] = {name: set() for name in named_blocks}
+
+    changed: bool = True
+    while changed:
+        changed = False
+        # Walk backwards so that most facts settle in a single sweep
+        for name in reversed(list(named_blocks.keys())):
+            out_fact = union([live_in[s] for s in succs[name]]
+                             ) | edge_uses[name]
+            in_fact = (out_fact - block_def[name]) | block_use[name]
+            if out_fact != live_out[name] or in_fact != live_in[name]:
+                changed = True
+                live_out[name] = out_fact
+                live_in[name] = in_fact
+
+    return live_in, live_out
+
+
+class InterferenceGraph:
+    """An undirected interference graph stored as an adjacency bit matrix:
+    every variable owns a row, and each row is a Python int whose i-th bit is
+    set when the variable interferes with variable i."""
+    def __init__(self, variables: Iterable[str]):
+        self.names: List[str] = []
+        self.index: Dict[str, int] = {}
+        self.rows: List[int] = []
+        for var in variables:
+            self.add_node(var)
+
+    def add_node(self, var: str) -> int:
+        if var not in self.index:
+            self.index[var] = len(self.names)
+            self.names.append(var)
+            self.rows.append(0)
+        return self.index[var]
+
+    def add_edge(self, u: str, v: str):
+        if u == v:
+            return
+        i, j = self.add_node(u), self.add_node(v)
+        self.rows[i] |= 1 << j
+        self.rows[j] |= 1 << i
+
+    def add_edges(self, u: str, others: Iterable[str]):
+        for v in others:
+            self.add_edge(u, v)
+
+    def interferes(self, u: str, v: str) -> bool:
+        return bool(self.rows[self.index[u]] >> self.index[v] & 1)
+
+    def neighbors(self, var: str) -> List[str]:
+        return self._members(self.rows[self.index[var]])
+
+    def degree(self, var: str) -> int:
+        return bin(self.rows[self.index[var]]).count('1')
+
+    def merge(self, keep: str, gone: str):
+        """Fold node `gone` into node `keep`: `keep` inherits every edge of
+        `gone`, and `gone` is left isolated."""
+        i, j = self.index[keep], self.index[gone]
+        row: int = self.rows[j]
+        for n in self._bits(row):
+            self.rows[n] = (self.rows[n] & ~(1 << j)) | (1 << i)
+        self.rows[i] = (self.rows[i] | row) & ~(1 << i)
+        self.rows[j] = 0
+
+    def _bits(self, row: int) -> Iterable[int]:
+        while row:
+            low = row & -row
+            yield low.bit_length() - 1
+            row ^= low
+
+    def _members(self, row: int) -> List[str]:
+        return [self.names[i] for i in self._bits(row)]
+
+
+def build_interference(
+    named_blocks: Dict[str, BlockType], func_args: List[str]
+) -> InterferenceGraph:
+    """Build the interference graph of a function in (or out of) SSA form.
+
+    Every definition interferes with whatever is live right after it, except
+    the source of an `id` copy. Phi copies are modelled at the end of each
+    predecessor, where they all happen in parallel just before its
+    terminator: a phi destination interferes with everything live out of the
+    predecessor, and with what the terminator reads, other than its own
+    argument along that edge.
+    """
+    live_in, live_out = ssa_liveness(named_blocks)
+    _, succs = edges(named_blocks)
+
+    variables: List[str] = list(func_args)
+    for block in named_blocks.values():
+        for instr in block:
+            if 'dest' in instr:
+                variables.append(instr['dest'])
+            variables.extend(
+                arg for arg in instr.get('args', []) if arg != UNDEFINED_VAR
+            )
+    graph = InterferenceGraph(variables)
+
+    # Arguments are all defined on entry to the function
+    entry: str = next(iter(named_blocks.keys()))
+    for arg in func_args:
+        graph.add_edges(arg, live_in[entry])
+        graph.add_edges(arg, func_args)
+
+    for name, block in named_blocks.items():
+        # The parallel copies that destruct the phis of the successors, which
+        # go in right before the terminator (and so before a `br` reads its
+        # condition)
+        live_at_copies: Set[str] = live_out[name] | set(
+            block[-1].get('args', [])
+        )
+        for succ in succs[name]:
+            for phi in _phis(named_blocks[succ]):
+                for label, arg in zip(phi['labels'], phi['args']):
+                    if label == name:
+                        graph.add_edges(phi['dest'], live_at_copies - {arg})
+
+        live: Set[str] = set(live_out[name])
+        for instr in reversed(_non_phis(block)):
+            if 'dest' in instr:
+                dest: str = instr['dest']
+                others: Set[str] = live - {dest}
+                if instr.get('op') == 'id':
+                    others -= set(instr['args'])
+                graph.add_edges(dest, others)
+                live.discard(dest)
+            live.update(instr.get('args', []))
+
+        # All the phis of a block define their destinations at once
+        phi_dests: List[str] = [phi['dest'] for phi in _phis(block)]
+        for dest in phi_dests:
+            graph.add_edges(dest, live)
+
+    return graph
+
+
+def copy_pairs(named_blocks: Dict[str, BlockType]) -> List[Tuple[str, str]]:
+    """Collect the (dest, source) pairs that coalescing tries to merge."""
+    pairs: List[Tuple[str, str]] = []
+    for block in named_blocks.values():
+        for instr in block:
+            if instr.get('op') == 'phi':
+                pairs.extend((instr['dest'], arg) for arg in instr['args']
+                             if arg != UNDEFINED_VAR)
+            elif instr.get('op') == 'id':
+                pairs.append((instr['dest'], instr['args'][0]))
+    return pairs
+
+
+def resolve_var_types(
+    func: JsonType, named_blocks: Dict[str, BlockType]
+) -> Dict[str, str]:
+    types: Dict[str, str] = {
+        arg['name']: arg['type']
+        for arg in func.get('args', [])
+    }
+    for block in named_blocks.values():
+        for instr in block:
+            if 'dest' in instr:
+                types[instr['dest']] = instr['type']
+    return types
+
+
+def _briggs(graph: InterferenceGraph, u: str, v: str, k: int) -> bool:
+    """Merging is safe if the merged node has fewer than `k` neighbors of
+    significant degree."""
+    significant: int = 0
+    shared: Set[str] = set(graph.neighbors(u)) & set(graph.neighbors(v))
+    for n in set(graph.neighbors(u)) | set(graph.neighbors(v)):
+        degree: int = graph.degree(n) - (1 if n in shared else 0)
+        if degree >= k:
+            significant += 1
+    return significant < k
+
+
+def _george(graph: InterferenceGraph, u: str, v: str, k: int) -> bool:
+    """Merging `v` into `u` is safe if every neighbor of `v` either already
+    interferes with `u` or has insignificant degree."""
+    return all(
+        graph.interferes(t, u) or graph.degree(t) < k
+        for t in graph.neighbors(v)
+    )
+
+
+def coalesce_copies(
+    graph: InterferenceGraph,
+    pairs: List[Tuple[str, str]],
+    types: Dict[str, str],
+    func_args: List[str],
+    mode: str = 'aggressive',
+    k: int = DEFAULT_K
+) -> Dict[str, str]:
+    """Merge copy-related variables that don't interfere.
+
+    Returns a map from every merged variable to the name of its class. A
+    class keeps the name of the function argument it contains, if any, since
+    arguments cannot be renamed; two arguments are never merged together.
+    """
+    if mode not in COALESCE_MODES:
+        raise ValueError(f'unknown coalescing mode {mode}')
+
+    leader: Dict[str, str] = {}
+
+    def _find(var: str) -> str:
+        while var in leader:
+            var = leader[var]
+        return var
+
+    pinned: Set[str] = set(func_args)
+
+    def _can_merge(u: str, v: str) -> bool:
+        if u == v:
+            return False
+        if graph.interferes(u, v) or types.get(u) != types.get(v):
+            return False
+        if u in pinned and v in pinned:
+            return False
+        if mode == 'aggressive':
+            return True
+        if mode == 'briggs':
+            return _briggs(graph, u, v, k)
+        if mode == 'george':
+            return _george(graph, u, v, k)
+        return _briggs(graph, u, v, k) or _george(graph, u, v, k)
+
+    changed: bool = True
+    while changed:
+        changed = False
+        for dest, src in pairs:
+            u, v = _find(dest), _find(src)
+            if not _can_merge(u, v):
+                continue
+            if v in pinned:
+                u, v = v, u
+            graph.merge(u, v)
+            leader[v] = u
+            changed = True
+
+    return {var: _find(var) for var in leader}
+
+
+def rename_vars(named_blocks: Dict[str, BlockType], renames: Dict[str, str]):
+    """Apply `renames` and drop the copies it turned into no-ops."""
+    for block in named_blocks.values():
+        for instr in block:
+            if 'dest' in instr:
+                instr['dest'] = renames.get(instr['dest'], instr['dest'])
+            if 'args' in instr:
+                instr['args'] = [renames.get(arg, arg) for arg in instr['args']]
+
+        block[:] = [
+            instr for instr in block if not (
+                instr.get('op') in ('id', 'phi') and
+                all(arg == instr['dest'] for arg in instr['args'])
+            )
+        ]
+
+
+def coalesce_function(
+    func: JsonType, mode: str = 'aggressive', k: int = DEFAULT_K
+) -> int:
+    """Coalesce the copies of `func` in place, returning how many variables
+    were merged away."""
+    named_blocks: Dict[str, BlockType] = block_map(
+        list(form_blocks(func['instrs']))
+    )
+    add_entry(named_blocks)
+    add_terminators(named_blocks)
+
+    func_args: List[str] = [arg['name'] for arg in func.get('args', [])]
+    graph = build_interference(named_blocks, func_args)
+    types: Dict[str, str] = resolve_var_types(func, named_blocks)
+
+    renames: Dict[str, str] = coalesce_copies(
+        graph, copy_pairs(named_blocks), types, func_args, mode, k
+    )
+    rename_vars(named_blocks, renames)
+    func['instrs'] = reassemble(named_blocks)
+    return len(renames)
+
+
+def main():
+    mode: str = sys.argv[1] if len(sys.argv) > 1 else 'aggressive'
+    k: int = int(sys.argv[2]) if len(sys.argv) > 2 else DEFAULT_K
+
+    bril_program: JsonType = json.load(sys.stdin)
+    for func in bril_program['functions']:
+        coalesce_function(func, mode, k)
+    print(json.dumps(bril_program, indent=2, sort_keys=True))
+
+
+if __name__ == "__main__":
+    main()
@@ -60,18 +60,18 @@ def live_variable_analysis(named_blocks: Dict[str, List[JsonType]]):
 
         for name, block in named_blocks.items():
             fact_union = union([block_in[v] for v in succ[name]])
-            if len(fact_union ^ block_out[name]) > 0:
+            fact_in = (fact_union - block_def[name]) | block_use[name]
+            if len(fact_union ^ block_out[name]) > 0 or \
+                    len(fact_in ^ block_in[name]) > 0:
                 changed = True
 
             block_out[name] = fact_union
-            block_in[name] = (block_out[name] -
-                              block_def[name]) | block_use[name]
+            block_in[name] = fact_in
 
         if not changed:
             break
 
-    print(block_in)
-    print(block_out)
+    return dict(block_in), dict(block_out)
 
 
 def dataflow_analysis():
@@ -82,7 +82,9 @@ def dataflow_analysis():
         add_terminators(named_blocks)
 
         # Run iterative dataflow analysis framework
-        live_variable_analysis(named_blocks)
+        block_in, block_out = live_variable_analysis(named_blocks)
+        print(block_in)
+        print(block_out)
 
 
 if __name__ == "__main__":
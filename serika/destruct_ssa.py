@@ -5,6 +5,7 @@ from typing import (Dict, List, Tuple)
 from bril_type import (BlockType, JsonType)
 from cfg import (block_map, add_entry, add_terminators, edges, reassemble)
 from form_blocks import form_blocks
+from to_ssa import UNDEFINED_VAR
 
 
 def run_on_func(named_blocks: Dict[str, BlockType]):
@@ -17,6 +18,10 @@ def run_on_func(named_blocks: Dict[str, BlockType]):
                 preds: List[str] = instr.get('labels')
                 values: List[str] = instr.get('args')
                 for (pred, value) in zip(preds, values):
+                    if value in (instr.get('dest'), UNDEFINED_VAR):
+                        # A coalesced phi operand needs no copy, and neither
+                        # does a variable undefined along that edge
+                        continue
                     named_blocks[pred].insert(
                         -1, {
                             "op": 'id',
@@ -64,12 +64,16 @@ def dominator_tree(named_blocks) -> Dict[str, List[str]]:
             ancestor[v] = ancestor[a]
         return best[v]
 
-    for i in range(len(named_blocks), 1, -1):
+    # Blocks unreachable from the entry are not numbered by `dfs`, they don't
+    # take part in dominance at all.
+    for i in range(len(dfn), 1, -1):
         v = dfn_to_block[i]
         p = parent[v]
 
         s = parent[v]
         for pred in predecessors[v]:
+            if pred not in dfn:
+                continue
             if dfn[pred] <= dfn[v]:
                 temp = pred
             else:
@@ -92,7 +96,7 @@ def dominator_tree(named_blocks) -> Dict[str, List[str]]:
                 rdom[vertex] = b
         bucket[p].clear()
 
-    for i in range(2, len(named_blocks) + 1):
+    for i in range(2, len(dfn) + 1):
         v = dfn_to_block[i]
         if v not in idom:
             idom[v] = idom[rdom[v]]
@@ -138,6 +142,10 @@ def dominator_frontier(named_blocks, dom_tree):
 
         fronts[v] = list(temp_fronts)
 
+    # Unreachable blocks have no frontier
+    for v in named_blocks:
+        fronts.setdefault(v, [])
+
     return fronts
 
 
@@ -0,0 +1,548 @@
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import sys
+import time
+from collections import Counter
+from copy import deepcopy
+from typing import (List, Optional, Tuple)
+
+from bril_interp import (BrilError, DEFAULT_MAX_STEPS, run_program)
+from bril_type import JsonType
+from is_ssa import is_ssa
+from server import (PASSES, run_pipeline)
+
+# Differential fuzzing of the optimization passes: generate random, well-formed
+# and terminating Bril programs, run them through a pipeline of passes, and
+# compare what the original and the optimized programs print using the
+# reference interpreter. Failing programs are shrunk before being reported.
+#
+#   python3 fuzz.py -n 10000 -p to_ssa destruct_ssa tdce
+
+DEFAULT_PIPELINE: List[str] = ['to_ssa', 'coalesce', 'destruct_ssa', 'tdce']
+
+INT_OPS: List[str] = ['add', 'sub', 'mul']
+CMP_OPS: List[str] = ['eq', 'lt', 'gt', 'le', 'ge']
+LOGIC_OPS: List[str] = ['and', 'or']
+
+
+class ProgramGenerator:
+    """Generate a random program: a `main` function and a few helper
+    functions it calls, made of straight-line code, if(-else) diamonds,
+    counted loops and dead code. Every variable is defined on entry, so every
+    use is defined on every path, every loop runs a bounded number of times,
+    and helpers only call the helpers generated before them."""
+    def __init__(
+        self,
+        rng: random.Random,
+        num_vars: int = 4,
+        max_depth: int = 3,
+        max_stmts: int = 6,
+        max_helpers: int = 2
+    ):
+        self.rng = rng
+        self.num_vars: int = num_vars
+        self.max_depth: int = max_depth
+        self.max_stmts: int = max_stmts
+        self.max_helpers: int = max_helpers
+
+        # The helpers that the function being generated may call
+        self.callees: List[str] = []
+        self.num_labels: int = 0
+        self.num_loops: int = 0
+        self.num_consts: int = 0
+
+        # The state of the function being generated, see `_function`
+        self.ints: List[str] = []
+        self.bools: List[str] = []
+        self.readonly_ints: List[str] = []
+        # The join labels of the enclosing ifs
+        self.joins: List[str] = []
+        self.instrs: List[JsonType] = []
+        self.ret_type: Optional[str] = None
+        self.may_print: bool = True
+
+    def _label(self, hint: str) -> str:
+        self.num_labels += 1
+        return f"{hint}.{self.num_labels}"
+
+    def _emit(self, instr: JsonType):
+        self.instrs.append(instr)
+
+    def _int_arg(self) -> str:
+        return self.rng.choice(self.ints + self.readonly_ints)
+
+    def _assign_const(self, var: str, type_name: str, value):
+        self._emit({
+            'op': 'const',
+            'dest': var,
+            'type': type_name,
+            'value': value
+        })
+
+    def _call(self):
+        instr: JsonType = {
+            'op': 'call',
+            'funcs': [self.rng.choice(self.callees)],
+            'args': [self._int_arg(), self.rng.choice(self.bools)]
+        }
+        # Helpers are called for their prints alone now and then
+        if self.rng.random() < 0.8:
+            instr['dest'] = self.rng.choice(self.ints)
+            instr['type'] = 'int'
+        self._emit(instr)
+
+    def _assign(self):
+        kinds: List[str] = ['int', 'int', 'cmp', 'logic', 'id']
+        if self.callees:
+            kinds.append('call')
+        kind: str = self.rng.choice(kinds)
+        if kind == 'int':
+            self._emit({
+                'op': self.rng.choice(INT_OPS),
+                'dest': self.rng.choice(self.ints),
+                'type': 'int',
+                'args': [self._int_arg(), self._int_arg()]
+            })
+        elif kind == 'cmp':
+            self._emit({
+                'op': self.rng.choice(CMP_OPS),
+                'dest': self.rng.choice(self.bools),
+                'type': 'bool',
+                'args': [self._int_arg(), self._int_arg()]
+            })
+        elif kind == 'logic':
+            if self.rng.random() < 0.3:
+                op, args = 'not', [self.rng.choice(self.bools)]
+            else:
+                op = self.rng.choice(LOGIC_OPS)
+                args = [self.rng.choice(self.bools) for _ in range(2)]
+            self._emit({
+                'op': op,
+                'dest': self.rng.choice(self.bools),
+                'type': 'bool',
+                'args': args
+            })
+        elif kind == 'call':
+            self._call()
+        elif self.rng.random() < 0.3:
+            self._emit({
+                'op': 'id',
+                'dest': self.rng.choice(self.ints),
+                'type': 'int',
+                'args': [self._int_arg()]
+            })
+        elif self.rng.random() < 0.5:
+            # Copies of the booleans that branches are on
+            self._emit({
+                'op': 'id',
+                'dest': self.rng.choice(self.bools),
+                'type': 'bool',
+                'args': [self.rng.choice(self.bools)]
+            })
+        else:
+            self._assign_const(
+                self.rng.choice(self.ints), 'int', self.rng.randint(-8, 8)
+            )
+
+    def _print(self):
+        if not self.may_print:
+            self._assign()
+            return
+        pool: List[str] = self.ints + self.bools + self.readonly_ints
+        self._emit({
+            'op': 'print',
+            'args': self.rng.sample(pool, self.rng.randint(1, 2))
+        })
+
+    def _ret(self):
+        if self.may_print:
+            self._print()
+        if self.ret_type is None:
+            self._emit({'op': 'ret', 'args': []})
+        else:
+            self._emit({'op': 'ret', 'args': [self.rng.choice(self.ints)]})
+
+    def _if(self, depth: int):
+        then_label: str = self._label('then')
+        else_label: str = self._label('else')
+        join_label: str = self._label('join')
+        # Without an else, the branch itself is an edge into the join
+        has_else: bool = self.rng.random() < 0.5
+
+        self._emit({
+            'op': 'br',
+            'args': [self.rng.choice(self.bools)],
+            'labels': [then_label, else_label if has_else else join_label]
+        })
+        self.joins.append(join_label)
+        self._emit({'label': then_label})
+        if not self._block(depth + 1, may_return=True):
+            self._emit({'op': 'jmp', 'labels': [join_label]})
+        if has_else:
+            self._emit({'label': else_label})
+            self._block(depth + 1)
+        self.joins.pop()
+        self._emit({'label': join_label})
+
+    def _leave(self):
+        """Branch out to the join of an enclosing if, skipping the rest of
+        it (and of any loop in between)."""
+        next_label: str = self._label('next')
+        self._emit({
+            'op': 'br',
+            'args': [self.rng.choice(self.bools)],
+            'labels': [self.rng.choice(self.joins), next_label]
+        })
+        self._emit({'label': next_label})
+
+    def _loop(self, depth: int):
+        self.num_loops += 1
+        counter: str = f"i{self.num_loops}"
+        bound: str = f"n{self.num_loops}"
+        step: str = f"s{self.num_loops}"
+        cond: str = f"t{self.num_loops}"
+        head_label: str = self._label('head')
+        body_label: str = self._label('body')
+        exit_label: str = self._label('exit')
+
+        self._emit({'op': 'const', 'dest': counter, 'type': 'int', 'value': 0})
+        self._emit({
+            'op': 'const',
+            'dest': bound,
+            'type': 'int',
+            'value': self.rng.randint(0, 4)
+        })
+        self._emit({'op': 'const', 'dest': step, 'type': 'int', 'value': 1})
+        self._emit({'label': head_label})
+        self._emit({
+            'op': 'lt',
+            'dest': cond,
+            'type': 'bool',
+            'args': [counter, bound]
+        })
+        self._emit({
+            'op': 'br',
+            'args': [cond],
+            'labels': [body_label, exit_label]
+        })
+        self._emit({'label': body_label})
+
+        self.readonly_ints += [counter, bound]
+        self._block(depth + 1)
+        self.readonly_ints = self.readonly_ints[:-2]
+
+        self._emit({
+            'op': 'add',
+            'dest': counter,
+            'type': 'int',
+            'args': [counter, step]
+        })
+        self._emit({'op': 'jmp', 'labels': [head_label]})
+        self._emit({'label': exit_label})
+
+    def _dead(self, depth: int):
+        """Emit statements that never run: either jumped over, and so
+        unreachable, or on the side of a branch on a constant not taken."""
+        dead_label: str = self._label('dead')
+        live_label: str = self._label('live')
+
+        if self.rng.random() < 0.5:
+            self._emit({'op': 'jmp', 'labels': [live_label]})
+        else:
+            self.num_consts += 1
+            cond: str = f"k{self.num_consts}"
+            taken: bool = self.rng.random() < 0.5
+            self._assign_const(cond, 'bool', taken)
+            self._emit({
+                'op': 'br',
+                'args': [cond],
+                'labels': [live_label, dead_label] if taken else
+                [dead_label, live_label]
+            })
+        self._emit({'label': dead_label})
+        if not self._block(depth + 1, may_return=True):
+            self._emit({'op': 'jmp', 'labels': [live_label]})
+        self._emit({'label': live_label})
+
+    def _block(self, depth: int, may_return: bool = False) -> bool:
+        """Emit a list of statements. Returns whether it ended with a `ret`,
+        which is only allowed when `may_return` is set."""
+        for _ in range(self.rng.randint(1, self.max_stmts)):
+            roll: float = self.rng.random()
+            if depth < self.max_depth and roll < 0.15:
+                self._if(depth)
+            elif depth < self.max_depth and roll < 0.25:
+                self._loop(depth)
+            elif depth < self.max_depth and roll < 0.3:
+                self._dead(depth)
+            elif self.joins and roll < 0.35:
+                self._leave()
+            elif roll < 0.45:
+                self._print()
+            else:
+                self._assign()
+
+        if may_return and self.rng.random() < 0.1:
+            self._ret()
+            return True
+        return False
+
+    def _function(
+        self, name: str, ret_type: Optional[str], may_print: bool, depth: int
+    ) -> JsonType:
+        """Generate a function of `a: int` and `b: bool`, starting at nesting
+        `depth`."""
+        self.ints = ['a'] + [f"v{i}" for i in range(self.num_vars)]
+        self.bools = ['b'] + [f"c{i}" for i in range(self.num_vars)]
+        # Loop counters and bounds, which may only be read
+        self.readonly_ints = []
+        self.joins = []
+        self.instrs = []
+        self.ret_type = ret_type
+        self.may_print = may_print
+
+        for var in self.ints[1:]:
+            self._assign_const(var, 'int', self.rng.randint(-8, 8))
+        for var in self.bools[1:]:
+            self._assign_const(var, 'bool', self.rng.random() < 0.5)
+
+        self._block(depth)
+        if ret_type is None:
+            # Leave most variables dead at the end, and so free to coalesce
+            self._print()
+        else:
+            self._ret()
+
+        func: JsonType = {
+            'name': name,
+            'args': [{
+                'name': 'a',
+                'type': 'int'
+            }, {
+                'name': 'b',
+                'type': 'bool'
+            }],
+            'instrs': self.instrs
+        }
+        if ret_type is not None:
+            func['type'] = ret_type
+        return func
+
+    def generate(self) -> Tuple[JsonType, List[object]]:
+        """Get a program along with the arguments to run it with."""
+        helpers: List[JsonType] = []
+        for i in range(self.rng.randint(0, self.max_helpers)):
+            # Keep helpers small, and only some of them print
+            helpers.append(
+                self._function(
+                    f"f{i}", 'int', self.rng.random() < 0.5,
+                    self.max_depth - 1
+                )
+            )
+            self.callees.append(f"f{i}")
+        main: JsonType = self._function('main', None, True, 0)
+
+        args: List[object] = [
+            self.rng.randint(-8, 8), self.rng.random() < 0.5
+        ]
+        return {'functions': [main] + helpers}, args
+
+
+def check_program(
+    program: JsonType,
+    args: List[object],
+    pipeline: List[str],
+    max_slowdown: Optional[float] = None,
+    max_steps: int = DEFAULT_MAX_STEPS
+) -> Tuple[Optional[str], str, Tuple[int, int]]:
+    """Run `pipeline` on a copy of `program` and compare both programs. With
+    `max_slowdown`, an optimized program that executes more than that many
+    times the instructions of the original also counts as a failure. Both
+    programs are run for at most `max_steps` instructions; the original
+    running out raises a `BrilError`.
+
+    Returns the kind of failure (or None), a message, and the dynamic
+    instruction counts of the original and the optimized program.
+    """
+    expected, steps = run_program(program, args, max_steps)
+
+    optimized: JsonType = deepcopy(program)
+    try:
+        for name in pipeline:
+            run_pipeline(optimized, [name])
+            if name == 'to_ssa' and not is_ssa(optimized):
+                return 'not_ssa', 'to_ssa output is not in SSA form', (
+                    steps, 0
+                )
+    except Exception as e:
+        return 'crash', f'{type(e).__name__}: {e}', (steps, 0)
+
+    try:
+        actual, optimized_steps = run_program(optimized, args, max_steps)
+    except (BrilError, RecursionError) as e:
+        return 'error', f'{type(e).__name__}: {e}', (steps, 0)
+
+    if actual != expected:
+        return 'mismatch', f'expected {expected}, got {actual}', (
+            steps, optimized_steps
+        )
+    if max_slowdown is not None and optimized_steps > steps * max_slowdown:
+        return 'slowdown', (
+            f'{steps} -> {optimized_steps} dynamic instructions '
+            f'({optimized_steps / max(steps, 1):.2f}x)'
+        ), (steps, optimized_steps)
+    return None, '', (steps, optimized_steps)
+
+
+def shrink_program(
+    program: JsonType, args: List[object], pipeline: List[str], kind: str
+) -> JsonType:
+    """Delete instructions from the functions of `program` while it stays a
+    valid program that fails `pipeline` in the same way. Big chunks are tried
+    first, then ever smaller ones, down to single instructions."""
+    program = deepcopy(program)
+
+    # Deleting the increment of a loop counter makes the loop run forever:
+    # give up on candidates that run much longer than the original program
+    _, steps = run_program(program, args)
+    max_steps: int = 10 * steps + 1000
+
+    def _still_fails(candidate: JsonType) -> bool:
+        try:
+            return check_program(
+                candidate, args, pipeline, max_steps=max_steps
+            )[0] == kind
+        except (BrilError, RecursionError):
+            # The candidate itself goes wrong
+            return False
+
+    for f in range(len(program['functions'])):
+        chunk: int = max(1, len(program['functions'][f]['instrs']) // 2)
+        while True:
+            shrunk: bool = False
+            i: int = 0
+            while i < len(program['functions'][f]['instrs']):
+                candidate: JsonType = deepcopy(program)
+                del candidate['functions'][f]['instrs'][i:i + chunk]
+                if _still_fails(candidate):
+                    program = candidate
+                    shrunk = True
+                else:
+                    i += chunk
+            # Deleting a use may have made its definition deletable too
+            if chunk == 1 and not shrunk:
+                break
+            chunk = max(1, chunk // 2)
+    return program
+
+
+def fuzz_case(
+    task: Tuple[int, List[str], bool, Optional[float]]
+) -> JsonType:
+    """Generate, check and (on failure) shrink the program of one seed."""
+    seed, pipeline, shrink, max_slowdown = task
+    program, args = ProgramGenerator(random.Random(seed)).generate()
+    kind, message, steps = check_program(
+        program, args, pipeline, max_slowdown
+    )
+
+    result: JsonType = {
+        'seed': seed,
+        'kind': kind,
+        'message': message,
+        'steps': steps
+    }
+    if kind is not None:
+        # A tiny program has a huge relative overhead, so shrinking a
+        # slowdown only ever ends at an empty program
+        if shrink and kind != 'slowdown':
+            program = shrink_program(program, args, pipeline, kind)
+        result['program'] = program
+        result['args'] = args
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Differentially fuzz the optimization passes.'
+    )
+    parser.add_argument(
+        '-n', type=int, default=1000, help='number of programs to check'
+    )
+    parser.add_argument('--seed', type=int, default=0, help='first seed')
+    parser.add_argument(
+        '-j',
+        '--jobs',
+        type=int,
+        default=os.cpu_count(),
+        help='number of worker processes'
+    )
+    parser.add_argument(
+        '-p',
+        '--pipeline',
+        nargs='+',
+        default=DEFAULT_PIPELINE,
+        choices=sorted(PASSES.keys())
+    )
+    parser.add_argument(
+        '--no-shrink',
+        action='store_true',
+        help='report failing programs as generated'
+    )
+    parser.add_argument(
+        '--max-slowdown',
+        type=float,
+        help='fail programs whose dynamic instruction count grows by more '
+        'than this factor'
+    )
+    parser.add_argument(
+        '--out', help='write the failing programs to this directory'
+    )
+    args = parser.parse_args()
+
+    tasks = [(seed, args.pipeline, not args.no_shrink, args.max_slowdown)
+             for seed in range(args.seed, args.seed + args.n)]
+
+    start: float = time.perf_counter()
+    failures: List[JsonType] = []
+    total_steps: List[int] = [0, 0]
+    with multiprocessing.Pool(args.jobs) as pool:
+        for result in pool.imap_unordered(fuzz_case, tasks, chunksize=16):
+            if result['kind'] is None:
+                total_steps[0] += result['steps'][0]
+                total_steps[1] += result['steps'][1]
+            else:
+                failures.append(result)
+    elapsed: float = time.perf_counter() - start
+
+    failures.sort(key=lambda result: result['seed'])
+    for result in failures:
+        print(f"seed {result['seed']}: {result['kind']}: {result['message']}")
+        if args.out:
+            os.makedirs(args.out, exist_ok=True)
+            path = os.path.join(args.out, f"seed-{result['seed']}.json")
+            with open(path, 'w') as f:
+                json.dump(result, f, indent=2, sort_keys=True)
+
+    print(
+        f"pipeline: {' '.join(args.pipeline)}, {args.n} programs in "
+        f"{elapsed:.1f}s ({args.n / elapsed * 60:.0f} programs/min)"
+    )
+    kinds: Counter = Counter(result['kind'] for result in failures)
+    print(
+        f"failures: {len(failures)}" +
+        ''.join(f", {kind}: {count}" for kind, count in sorted(kinds.items()))
+    )
+    if total_steps[0]:
+        print(
+            f"dynamic instructions of passing programs: {total_steps[0]} -> "
+            f"{total_steps[1]} ({total_steps[1] / total_steps[0]:.2f}x)"
+        )
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
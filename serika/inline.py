@@ -0,0 +1,191 @@
+import json
+import sys
+from copy import deepcopy
+from typing import (Callable, Dict, List, Optional, Set)
+
+from bril_type import JsonType
+from callgraph import (call_graph, recursive_functions, schedule_bottom_up)
+from tdce import trivial_dce_function
+from utils import fresh
+
+# Callees with at most this many instructions get inlined.
+DEFAULT_INLINE_THRESHOLD: int = 32
+
+# Stop inlining into a caller once it grows past this many instructions.
+MAX_CALLER_SIZE: int = 1024
+
+
+def function_size(func: JsonType) -> int:
+    """Count the instructions (not labels) of `func`."""
+    return len([instr for instr in func['instrs'] if 'op' in instr])
+
+
+def used_names(func: JsonType) -> Set[str]:
+    """Collect every variable and label name appearing in `func`."""
+    names: Set[str] = set(arg['name'] for arg in func.get('args', []))
+    for instr in func['instrs']:
+        if 'label' in instr:
+            names.add(instr['label'])
+        if 'dest' in instr:
+            names.add(instr['dest'])
+        names.update(instr.get('args', []))
+        names.update(instr.get('labels', []))
+    return names
+
+
+def rename_callee(callee: JsonType, names: Set[str]) -> Dict[str, str]:
+    """Pick a fresh name (w.r.t. `names`) for every variable and label of
+    `callee`, adding the new names to `names`."""
+    renames: Dict[str, str] = {}
+    for name in sorted(used_names(callee)):
+        renames[name] = fresh(f"{name}.{callee['name']}.", names)
+        names.add(renames[name])
+    return renames
+
+
+def inline_call(call: JsonType, callee: JsonType,
+                names: Set[str]) -> List[JsonType]:
+    """Get the instructions that replace `call` with the body of `callee`.
+
+    Parameters the callee assigns to are bound with `id` copies, the others
+    are replaced by the arguments. Every `ret` becomes a copy into the call's
+    destination followed by a jump past the spliced body.
+    """
+    renames: Dict[str, str] = rename_callee(callee, names)
+    exit_label: str = fresh(f"ret.{callee['name']}.", names)
+    names.add(exit_label)
+
+    assigned: Set[str] = set(
+        instr['dest'] for instr in callee['instrs'] if 'dest' in instr
+    )
+
+    instrs: List[JsonType] = []
+    for param, arg in zip(callee.get('args', []), call.get('args', [])):
+        if param['name'] not in assigned:
+            # The callee only reads this parameter, read the argument instead
+            renames[param['name']] = arg
+            continue
+        instrs.append({
+            "op": 'id',
+            "dest": renames[param['name']],
+            "type": param['type'],
+            "args": [arg]
+        })
+
+    body: List[JsonType] = deepcopy(callee['instrs'])
+    for i, instr in enumerate(body):
+        if 'label' in instr:
+            instr['label'] = renames[instr['label']]
+            instrs.append(instr)
+            continue
+
+        if 'dest' in instr:
+            instr['dest'] = renames[instr['dest']]
+        if 'args' in instr:
+            instr['args'] = [renames[arg] for arg in instr['args']]
+        if 'labels' in instr:
+            instr['labels'] = [renames[label] for label in instr['labels']]
+
+        if instr['op'] == 'ret':
+            if instr.get('args') and 'dest' in call:
+                instrs.append({
+                    "op": 'id',
+                    "dest": call['dest'],
+                    "type": call['type'],
+                    "args": instr['args']
+                })
+            if i != len(body) - 1:
+                instrs.append({"op": 'jmp', "labels": [exit_label]})
+        else:
+            instrs.append(instr)
+
+    instrs.append({'label': exit_label})
+    return instrs
+
+
+def inline_function(
+    func: JsonType,
+    functions: Dict[str, JsonType],
+    recursive: Set[str],
+    threshold: int = DEFAULT_INLINE_THRESHOLD
+) -> int:
+    """Inline the small, non-recursive callees of `func` in place, returning
+    the number of calls that were inlined.
+
+    Inlining a call splits its block: the rest of the block, terminator
+    included, moves under the exit label of the spliced body. Phis naming the
+    block as a predecessor are updated to name that label instead, so SSA
+    functions stay valid.
+    """
+    names: Set[str] = used_names(func)
+    size: int = function_size(func)
+    inlined: int = 0
+
+    # Map each split block to the label its terminator ended up under
+    moved_to: Dict[str, str] = {}
+    block: Optional[str] = None
+
+    new_instrs: List[JsonType] = []
+    for instr in func['instrs']:
+        if 'label' in instr:
+            block = instr['label']
+
+        callee: Optional[JsonType] = None
+        if instr.get('op') == 'call':
+            callee = functions.get(instr['funcs'][0])
+
+        if (
+            callee is None or callee['name'] in recursive or
+            callee['name'] == func['name'] or
+            function_size(callee) > threshold or size > MAX_CALLER_SIZE
+        ):
+            new_instrs.append(instr)
+            continue
+
+        spliced: List[JsonType] = inline_call(instr, callee, names)
+        if block is not None:
+            moved_to[block] = spliced[-1]['label']
+        new_instrs += spliced
+        size += function_size(callee)
+        inlined += 1
+
+    for instr in new_instrs:
+        if instr.get('op') == 'phi':
+            instr['labels'] = [
+                moved_to.get(label, label) for label in instr['labels']
+            ]
+    func['instrs'] = new_instrs
+    return inlined
+
+
+def inline_program(
+    program: JsonType,
+    threshold: int = DEFAULT_INLINE_THRESHOLD,
+    func_pass: Callable[[JsonType], None] = trivial_dce_function
+):
+    """Inline calls across `program` bottom-up: each function is optimized by
+    `func_pass` before it gets inlined into its callers."""
+    functions: Dict[str, JsonType] = {
+        func['name']: func
+        for func in program['functions']
+    }
+    recursive: Set[str] = recursive_functions(call_graph(program))
+
+    def _optimize(func: JsonType):
+        inline_function(func, functions, recursive, threshold)
+        func_pass(func)
+
+    schedule_bottom_up(program, _optimize)
+
+
+def main():
+    threshold: int = int(sys.argv[1]) if len(sys.argv) > 1 \
+        else DEFAULT_INLINE_THRESHOLD
+
+    bril_program: JsonType = json.load(sys.stdin)
+    inline_program(bril_program, threshold)
+    print(json.dumps(bril_program, indent=2, sort_keys=True))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,231 @@
+import argparse
+import asyncio
+import json
+import os
+import sys
+from concurrent.futures import (Executor, ProcessPoolExecutor)
+from typing import (
+    Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+)
+
+from bril_type import JsonType
+from cfg import (block_map, add_entry, add_terminators)
+from coalesce import coalesce_function
+from dataflow import live_variable_analysis
+from destruct_ssa import destruct_cssa
+from form_blocks import form_blocks
+from inline import inline_program
+from simplify_cfg import simplify_cfg_on_function
+from tdce import trivial_dce_function
+from to_ssa import to_ssa_on_function
+
+# A long-running optimization server. It reads JSON-lines requests, one
+# request per line, either from stdin or from clients of a Unix socket:
+#
+#   {"id": 1, "program": {...}, "pipeline": ["to_ssa", "destruct_ssa"]}
+#
+# and answers each of them with a single line, as soon as it is done:
+#
+#   {"id": 1, "program": {...}, "analyses": {...}}
+#   {"id": 1, "error": "..."}
+#
+# The passes stay imported between requests, and the actual work is handed to
+# a pool of worker processes so requests are served concurrently.
+
+# Allow (very) long lines, a request carries a whole program.
+MAX_REQUEST_BYTES: int = 1 << 28
+
+# How many requests of a single stream may be in flight at once, per worker.
+# Past that, the server stops reading the stream until one is answered.
+IN_FLIGHT_PER_WORKER: int = 2
+
+
+def _on_functions(func_pass: Callable[[JsonType], Any]):
+    def _run(program: JsonType):
+        for func in program['functions']:
+            func_pass(func)
+
+    return _run
+
+
+def live_variables(func: JsonType) -> JsonType:
+    named_blocks = block_map(list(form_blocks(func['instrs'])))
+    add_entry(named_blocks)
+    add_terminators(named_blocks)
+
+    block_in, block_out = live_variable_analysis(named_blocks)
+    return {
+        'in': {name: sorted(fact)
+               for name, fact in block_in.items()},
+        'out': {name: sorted(fact)
+                for name, fact in block_out.items()},
+    }
+
+
+# Transformations, run on the whole program
+PASSES: Dict[str, Callable[[JsonType], None]] = {
+    'to_ssa': _on_functions(to_ssa_on_function),
+    'destruct_ssa': _on_functions(destruct_cssa),
+    'tdce': _on_functions(trivial_dce_function),
+    'coalesce': _on_functions(coalesce_function),
+    'inline': inline_program,
+    'simplify_cfg': _on_functions(simplify_cfg_on_function),
+}
+
+# Analyses, run on each function. Their results are returned to the client
+# rather than changing the program.
+ANALYSES: Dict[str, Callable[[JsonType], JsonType]] = {
+    'live': live_variables,
+}
+
+
+def run_pipeline(program: JsonType,
+                 pipeline: List[str]) -> Tuple[JsonType, JsonType]:
+    """Run `pipeline` on `program` in place. Returns the program along with
+    the results of the analyses in the pipeline, keyed by analysis then by
+    function name."""
+    analyses: Dict[str, Dict[str, JsonType]] = {}
+    for name in pipeline:
+        if name in PASSES:
+            PASSES[name](program)
+        elif name in ANALYSES:
+            analyses[name] = {
+                func['name']: ANALYSES[name](func)
+                for func in program['functions']
+            }
+        else:
+            raise ValueError(f'unknown pass {name}')
+    return program, analyses
+
+
+def handle_request(line: str) -> str:
+    """Serve a single request line, returning the response line."""
+    request_id: Optional[JsonType] = None
+    try:
+        request: JsonType = json.loads(line)
+        request_id = request.get('id')
+        program, analyses = run_pipeline(
+            request['program'], request.get('pipeline', [])
+        )
+        response: JsonType = {'id': request_id, 'program': program}
+        if analyses:
+            response['analyses'] = analyses
+    except Exception as e:
+        response = {'id': request_id, 'error': f'{type(e).__name__}: {e}'}
+    return json.dumps(response, sort_keys=True)
+
+
+async def serve_stream(
+    readline: Callable[[], Awaitable[bytes]],
+    write: Callable[[str], Awaitable[None]], executor: Executor,
+    max_in_flight: int
+):
+    """Answer every request read with `readline`, concurrently, with at most
+    `max_in_flight` of them read but not yet answered."""
+    loop = asyncio.get_running_loop()
+    # Only the requests still in flight, so a long-running server doesn't
+    # hold on to every request it ever served
+    pending: Set[asyncio.Task] = set()
+    in_flight = asyncio.Semaphore(max_in_flight)
+
+    async def _serve(line: str):
+        try:
+            response: str = await loop.run_in_executor(
+                executor, handle_request, line
+            )
+            await write(response + '\n')
+        finally:
+            in_flight.release()
+
+    while True:
+        await in_flight.acquire()
+        line: bytes = await readline()
+        if not line:
+            break
+        if not line.strip():
+            in_flight.release()
+        else:
+            task: asyncio.Task = asyncio.create_task(_serve(line.decode()))
+            pending.add(task)
+            task.add_done_callback(pending.discard)
+
+    await asyncio.gather(*pending)
+
+
+async def serve_stdin(executor: Executor, max_in_flight: int):
+    loop = asyncio.get_running_loop()
+
+    # stdin may be a regular file, which asyncio can't watch: block on it in a
+    # helper thread instead.
+    def _readline() -> Awaitable[bytes]:
+        return loop.run_in_executor(None, sys.stdin.buffer.readline)
+
+    async def _write(response: str):
+        sys.stdout.write(response)
+        sys.stdout.flush()
+
+    await serve_stream(_readline, _write, executor, max_in_flight)
+
+
+async def serve_socket(path: str, executor: Executor, max_in_flight: int):
+    async def _on_client(
+        reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ):
+        async def _write(response: str):
+            # Wait for slow clients rather than buffering without bound
+            writer.write(response.encode())
+            await writer.drain()
+
+        try:
+            await serve_stream(
+                reader.readline, _write, executor, max_in_flight
+            )
+        finally:
+            writer.close()
+
+    server = await asyncio.start_unix_server(
+        _on_client, path=path, limit=MAX_REQUEST_BYTES
+    )
+    async with server:
+        await server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Serve optimization requests as JSON lines.'
+    )
+    parser.add_argument(
+        '--socket', help='listen on this Unix socket instead of stdin'
+    )
+    parser.add_argument(
+        '--workers',
+        type=int,
+        default=os.cpu_count(),
+        help='number of worker processes'
+    )
+    args = parser.parse_args()
+
+    max_in_flight: int = IN_FLIGHT_PER_WORKER * args.workers
+    with ProcessPoolExecutor(max_workers=args.workers) as executor:
+        # Start the workers now rather than on the first requests. The pool
+        # starts a process per task submitted while none is idle.
+        warm_up = [executor.submit(int) for _ in range(args.workers)]
+        for future in warm_up:
+            future.result()
+        if args.socket:
+            if os.path.exists(args.socket):
+                os.unlink(args.socket)
+            try:
+                asyncio.run(
+                    serve_socket(args.socket, executor, max_in_flight)
+                )
+            except KeyboardInterrupt:
+                pass
+            finally:
+                os.unlink(args.socket)
+        else:
+            asyncio.run(serve_stdin(executor, max_in_flight))
+
+
+if __name__ == "__main__":
+    main()
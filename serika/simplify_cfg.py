@@ -0,0 +1,205 @@
+import json
+import sys
+from typing import (Dict, List, Optional, Set)
+
+from bril_type import (BlockType, JsonType)
+from cfg import (block_map, add_terminators, edges, reachable, reassemble)
+from form_blocks import form_blocks
+from to_ssa import UNDEFINED_VAR
+
+# CFG simplification: fold branches on constants, thread jumps through empty
+# blocks, drop unreachable blocks and merge straight-line chains of blocks,
+# until nothing changes. The phis of SSA programs are kept up to date.
+
+
+def _entry(named_blocks: Dict[str, BlockType]) -> str:
+    return next(iter(named_blocks.keys()))
+
+
+def _has_phis(block: BlockType) -> bool:
+    return any(instr.get('op') == 'phi' for instr in block)
+
+
+def drop_phi_edge(block: BlockType, pred: str):
+    """Remove the phi arguments flowing into `block` from `pred`."""
+    for instr in block:
+        if instr.get('op') == 'phi' and pred in instr['labels']:
+            pairs = [(label, arg)
+                     for label, arg in zip(instr['labels'], instr['args'])
+                     if label != pred]
+            instr['labels'] = [label for label, _ in pairs]
+            instr['args'] = [arg for _, arg in pairs]
+
+
+def _const_value(block: BlockType, var: str) -> Optional[bool]:
+    """Get the constant `var` holds at the end of `block`, if it is known."""
+    for instr in reversed(block):
+        if instr.get('dest') == var:
+            if instr['op'] == 'const':
+                return instr['value']
+            return None
+    return None
+
+
+def fold_branches(named_blocks: Dict[str, BlockType]) -> bool:
+    """Turn branches on a known condition, or to a single target, into
+    jumps."""
+    changed: bool = False
+    for name, block in named_blocks.items():
+        term: JsonType = block[-1]
+        if term['op'] != 'br':
+            continue
+
+        taken: Optional[str] = None
+        if term['labels'][0] == term['labels'][1]:
+            taken = term['labels'][0]
+        else:
+            cond: Optional[bool] = _const_value(block, term['args'][0])
+            if cond is not None:
+                taken = term['labels'][0 if cond else 1]
+        if taken is None:
+            continue
+
+        for label in term['labels']:
+            if label != taken:
+                drop_phi_edge(named_blocks[label], name)
+        block[-1] = {'op': 'jmp', 'labels': [taken]}
+        changed = True
+    return changed
+
+
+def remove_unreachable(named_blocks: Dict[str, BlockType]) -> bool:
+    """Delete the blocks that can't be reached from the entry."""
+    _, succs = edges(named_blocks)
+
+    live: Set[str] = reachable(named_blocks)
+    unreachable: List[str] = [
+        name for name in named_blocks if name not in live
+    ]
+    for name in unreachable:
+        for succ in succs[name]:
+            drop_phi_edge(named_blocks[succ], name)
+    for name in unreachable:
+        del named_blocks[name]
+    return len(unreachable) > 0
+
+
+def thread_jumps(named_blocks: Dict[str, BlockType]) -> bool:
+    """Retarget jumps to a block that only jumps on (possibly through a chain
+    of such blocks) straight to the final target."""
+    entry: str = _entry(named_blocks)
+    forward: Dict[str, str] = {}
+    for name, block in named_blocks.items():
+        if name == entry or len(block) != 1 or block[0]['op'] != 'jmp':
+            continue
+        target: str = block[0]['labels'][0]
+        # Retargeting would need new phi arguments in `target`
+        if target != name and not _has_phis(named_blocks[target]):
+            forward[name] = target
+
+    # The final target of each forwarding block, filled in as chains are
+    # walked so that every chain is only walked once
+    resolved: Dict[str, str] = {}
+
+    def _resolve(label: str) -> str:
+        path: List[str] = []
+        on_path: Set[str] = set()
+        while label in forward and label not in resolved \
+                and label not in on_path:
+            path.append(label)
+            on_path.add(label)
+            label = forward[label]
+        final: str = resolved.get(label, label)
+        for name in path:
+            resolved[name] = final
+        return final
+
+    changed: bool = False
+    for block in named_blocks.values():
+        term: JsonType = block[-1]
+        if 'labels' not in term:
+            continue
+        labels: List[str] = [_resolve(label) for label in term['labels']]
+        if labels != term['labels']:
+            term['labels'] = labels
+            changed = True
+    return changed
+
+
+def merge_blocks(named_blocks: Dict[str, BlockType]) -> bool:
+    """Append a block to its predecessor when that predecessor is the only
+    one, and the block its only successor. Whole chains of such blocks are
+    merged at once."""
+    changed: bool = False
+    entry: str = _entry(named_blocks)
+    preds, succs = edges(named_blocks)
+    for name in list(named_blocks.keys()):
+        if name not in named_blocks:
+            continue
+        while len(succs[name]) == 1:
+            succ: str = succs[name][0]
+            if succ == name or succ == entry or len(preds[succ]) != 1:
+                break
+
+            body: BlockType = []
+            for instr in named_blocks[succ]:
+                if instr.get('op') == 'phi':
+                    # A single predecessor leaves a single incoming value
+                    if instr['args'][:1] in ([], [UNDEFINED_VAR]):
+                        continue
+                    instr = {
+                        'op': 'id',
+                        'dest': instr['dest'],
+                        'type': instr['type'],
+                        'args': instr['args'][:1]
+                    }
+                body.append(instr)
+
+            for after in set(succs[succ]):
+                for instr in named_blocks[after]:
+                    if instr.get('op') == 'phi':
+                        instr['labels'] = [
+                            name if label == succ else label
+                            for label in instr['labels']
+                        ]
+                preds[after] = [
+                    name if pred == succ else pred for pred in preds[after]
+                ]
+
+            named_blocks[name][-1:] = body
+            succs[name] = succs.pop(succ)
+            del preds[succ]
+            del named_blocks[succ]
+            changed = True
+    return changed
+
+
+def simplify_cfg(named_blocks: Dict[str, BlockType]):
+    """Simplify a CFG (with terminators) in place until it converges."""
+    changed: bool = True
+    while changed:
+        changed = fold_branches(named_blocks)
+        changed |= thread_jumps(named_blocks)
+        changed |= remove_unreachable(named_blocks)
+        changed |= merge_blocks(named_blocks)
+
+
+def simplify_cfg_on_function(func: JsonType):
+    named_blocks: Dict[str, BlockType] = block_map(
+        list(form_blocks(func['instrs']))
+    )
+    add_terminators(named_blocks)
+
+    simplify_cfg(named_blocks)
+    func['instrs'] = reassemble(named_blocks, fallthrough=True)
+
+
+def main():
+    bril_program: JsonType = json.load(sys.stdin)
+    for func in bril_program['functions']:
+        simplify_cfg_on_function(func)
+    print(json.dumps(bril_program, indent=2, sort_keys=True))
+
+
+if __name__ == "__main__":
+    main()
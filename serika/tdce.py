@@ -10,6 +10,9 @@ from form_blocks import form_blocks
 # i.e. which happens within the scope of each basic block,
 # which can avoids the complex control/data flow analysis.
 
+# Instructions that must be kept even when their result is never used.
+EFFECT_OPS: List[str] = ['call']
+
 
 # TODO (cycloidzzz) : type hints
 def trivial_dce_pass(function: JsonType) -> bool:
@@ -25,11 +28,11 @@ def trivial_dce_pass(function: JsonType) -> bool:
 
     for block in blocks:
         new_block = [
-            i for i in block if 'dest' not in i or i['dest'] in used_set
+            i for i in block if 'dest' not in i or i['dest'] in used_set or
+            i['op'] in EFFECT_OPS
         ]
         changed |= (len(block) != len(new_block))
         block[:] = new_block
-        print(f"Current block = {block}")
 
     function['instrs'] = list(itertools.chain(*blocks))
     return changed
@@ -47,6 +50,7 @@ def remove_killed_instructions_pass(function: JsonType):
 
     for block in blocks:
         last_def_map = {}
+        killed = []
 
         for instr in block:
             # Check for uses of instr
@@ -58,11 +62,18 @@ def remove_killed_instructions_pass(function: JsonType):
             # Check for def
             if 'dest' in instr:
                 dest: str = instr['dest']
-                if dest in last_def_map:
+                if dest in last_def_map and \
+                        last_def_map[dest]['op'] not in EFFECT_OPS:
                     changed = True
-                    block.remove(last_def_map[dest])
+                    killed.append(last_def_map[dest])
                 last_def_map[dest] = instr
 
+        # Compare by identity, the block may hold equal instructions
+        block[:] = [
+            instr for instr in block
+            if not any(instr is kill for kill in killed)
+        ]
+
     function['instrs'] = list(itertools.chain(*blocks))
     return changed
 
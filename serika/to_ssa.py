@@ -5,17 +5,23 @@ from collections import defaultdict
 from typing import (Dict, List, Optional, Set, Tuple)
 
 from bril_type import (BlockType, JsonType)
-from cfg import (block_map, add_entry, add_terminators, edges, reassemble)
+from cfg import (
+    block_map, add_entry, add_terminators, edges, reachable, reassemble
+)
+from dataflow import live_variable_analysis
 from dom import (dominator_tree, dominator_frontier)
 from form_blocks import form_blocks
 
+# The phi argument for a predecessor along which the variable is undefined
+UNDEFINED_VAR: str = '__undefined'
+
 
 def resolve_defs(func: JsonType, named_block: Dict[str, List[BlockType]]):
     defs: Dict[str, Set[str]] = defaultdict(set)
     # Add defs for function arguments
     entry_block = list(named_block.keys())[0]
 
-    defs.update({arg: entry_block for arg in func.get('args', [])})
+    defs.update({arg['name']: {entry_block} for arg in func.get('args', [])})
 
     # Add defs for non args
     for name, block in named_block.items():
@@ -41,9 +47,11 @@ def resolve_types(func: JsonType):
 
 def get_phis(
     named_blocks: Dict[str, BlockType], defs_map: Dict[str, Set[str]],
-    dom_front: Dict[str, List[str]]
+    dom_front: Dict[str, List[str]], live_in: Dict[str, Set[str]]
 ) -> Dict[str, Set[str]]:
-    """Figure out the phis to insert for each basic block."""
+    """Figure out the phis to insert for each basic block.
+    Only variables live on entry to a block get a phi there (pruned SSA).
+    """
     variables: List[str] = list(defs_map.keys())
     block_phis: Dict[str,
                      Set[str]] = {name: set()
@@ -53,6 +61,8 @@ def get_phis(
         work_list: List[str] = list(defs_map[v])
         for block in work_list:
             for front in dom_front[block]:
+                if v not in live_in[front]:
+                    continue
                 if v not in block_phis[front]:
                     block_phis[front].add(v)
                     if front not in defs_map[v]:
@@ -111,8 +121,10 @@ def ssa_rename(
 
         for succ in succs[root]:
             for phi in block_phis[succ]:
-                if phi in var_stack:
+                if var_stack.get(phi):
                     phi_args[succ][phi].add((root, var_stack[phi][0]))
+                else:
+                    phi_args[succ][phi].add((root, UNDEFINED_VAR))
 
         for v in dom_tree[root]:
             _rename(v)
@@ -133,8 +145,8 @@ def insert_phis(
     """Insert phis into each basic block."""
     for name, block in named_blocks.items():
         for var, p in phi_dest[name].items():
-            arg_pairs: List[Tuple[str, str]] = list(phi_args[name][var])
-            if len(arg_pairs) >= 2:
+            arg_pairs: List[Tuple[str, str]] = sorted(phi_args[name][var])
+            if arg_pairs:
                 phi_instr: JsonType = {
                     "op": 'phi',
                     "dest": p,
@@ -149,8 +161,13 @@ def to_ssa_on_function(func: JsonType):
     named_blocks = block_map(list(form_blocks(func['instrs'])))
     add_entry(named_blocks)
     add_terminators(named_blocks)
+    # Renaming walks the dominator tree, which unreachable blocks are not in
+    live: Set[str] = reachable(named_blocks)
+    for name in list(named_blocks.keys()):
+        if name not in live:
+            del named_blocks[name]
 
-    func_args: Set[str] = set([arg for arg in func.get('args', [])])
+    func_args: Set[str] = set([arg['name'] for arg in func.get('args', [])])
 
     def_map: Dict[str, List[str]] = resolve_defs(func, named_blocks)
     types_map: Dict[str, str] = resolve_types(func)
@@ -158,7 +175,8 @@ def to_ssa_on_function(func: JsonType):
     dom_tree = dominator_tree(named_blocks)
     dom_front = dominator_frontier(named_blocks, dom_tree)
 
-    block_phis = get_phis(named_blocks, def_map, dom_front)
+    live_in, _ = live_variable_analysis(named_blocks)
+    block_phis = get_phis(named_blocks, def_map, dom_front, live_in)
 
     phi_args, phi_dest = ssa_rename(
         named_blocks, func_args, block_phis, dom_tree